@@ -0,0 +1,193 @@
+from copy import deepcopy
+from random import Random
+from time import perf_counter
+
+import numpy as np
+import pytest
+
+import wlkernel
+
+
+def random_triples(seed, n_entities=40, n_predicates=4, n_triples=120):
+    'Generate a random list of RDF triples'
+    rng = Random(seed)
+    entities = ['E{}'.format(k) for k in range(n_entities)]
+    predicates = ['P{}'.format(k) for k in range(n_predicates)]
+    triples = {
+        (rng.choice(entities), rng.choice(predicates), rng.choice(entities))
+        for _ in range(n_triples)
+    }
+    instances = rng.sample(entities, 8)
+    return sorted(triples), instances
+
+
+def timed(function, *args, **kwargs):
+    start = perf_counter()
+    result = function(*args, **kwargs)
+    return result, perf_counter() - start
+
+
+def test_backend_selection():
+    assert 'reference' in wlkernel.available_backends()
+    assert wlkernel.get_backend().name == 'reference'
+    reference = wlkernel.get_backend('reference')
+    assert reference.operations['wl_kernel'] is wlkernel.wl_kernel
+
+    wlkernel.set_backend('indexed')
+    try:
+        assert wlkernel.get_backend().name == 'indexed'
+    finally:
+        wlkernel.set_backend('reference')
+
+    with pytest.raises(ValueError):
+        wlkernel.get_backend('unknown')
+    with pytest.raises(ValueError):
+        wlkernel.set_backend('unknown')
+    with pytest.raises(ValueError):
+        wlkernel.Backend('broken', unknown_operation=print)
+
+
+def test_backend_fallback():
+    backend = wlkernel.Backend('partial', wl_kernel=wlkernel.wl_kernel)
+    reference = wlkernel.get_backend('reference')
+    assert (
+        backend.operations['wlrdf_kernel_matrix']
+        is reference.operations['wlrdf_kernel_matrix']
+    )
+
+
+def test_backend_relabel_composition():
+    triples, instances = random_triples(0)
+    calls = []
+
+    def wl_relabel(*args, **kwargs):
+        calls.append('wl')
+        wlkernel.wl_relabel(*args, **kwargs)
+
+    def wlrdf_relabel(*args, **kwargs):
+        calls.append('wlrdf')
+        wlkernel.WLRDFGraph.relabel(*args, **kwargs)
+
+    backend = wlkernel.Backend(
+        'relabel-only', wl_relabel=wl_relabel, wlrdf_relabel=wlrdf_relabel
+    )
+    wl_graphs = [backend.wl_graph(triples, i, 2) for i in instances]
+    backend.wl_kernel_matrix(wl_graphs, 1)
+    backend.wl_kernel(wl_graphs[0], wl_graphs[1], 2)
+    graph = backend.wlrdf_graph(triples, instances, 2)
+    backend.wlrdf_kernel(graph, instances[0], instances[1], 1)
+    backend.wlrdf_kernel_matrix(graph, instances, 2, streaming=True)
+    assert calls == ['wl', 'wl', 'wlrdf', 'wlrdf']
+
+
+def assert_same_partition(label_pairs):
+    'Check that two labelings are equal up to a renaming of the labels'
+    forward, backward = dict(), dict()
+    for label_1, label_2 in label_pairs:
+        assert forward.setdefault(label_1, label_2) == label_2
+        assert backward.setdefault(label_2, label_1) == label_1
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('max_depth', [1, 2, 3])
+@pytest.mark.parametrize('iterations', [1, 3])
+def test_wl_relabel_backends(seed, max_depth, iterations):
+    triples, instances = random_triples(seed)
+    reference = wlkernel.get_backend('reference')
+    expected = [
+        reference.wl_graph(triples, instance, max_depth)
+        for instance in instances
+    ]
+
+    copies = dict()
+    for name in wlkernel.available_backends():
+        memo = dict()
+        copies[name] = deepcopy(expected, memo), memo
+        wlkernel.get_backend(name).wl_relabel(copies[name][0], iterations)
+    reference.wl_relabel(expected, iterations)
+
+    for name, (actual, memo) in copies.items():
+        for it in range(iterations + 1):
+            assert_same_partition(
+                (label, actual_graph.labels[it][memo[id(x)]])
+                for expected_graph, actual_graph in zip(expected, actual)
+                for x, label in expected_graph.labels[it].items()
+            )
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('max_depth', [1, 2, 3])
+@pytest.mark.parametrize('iterations', [1, 3])
+def test_wlrdf_relabel_backends(seed, max_depth, iterations):
+    triples, instances = random_triples(seed)
+    reference = wlkernel.get_backend('reference')
+    expected = reference.wlrdf_graph(triples, instances, max_depth)
+    copies = dict()
+    for name in wlkernel.available_backends():
+        memo = dict()
+        copies[name] = deepcopy(expected, memo), memo
+        wlkernel.get_backend(name).wlrdf_relabel(copies[name][0], iterations)
+    reference.wlrdf_relabel(expected, iterations)
+
+    for name, (actual, memo) in copies.items():
+        for it in range(iterations + 1):
+            assert_same_partition(
+                (label, actual.labels[it][(memo[id(x)], j)])
+                for (x, j), label in expected.labels[it].items()
+            )
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('max_depth', [0, 1, 2, 3])
+@pytest.mark.parametrize('iterations', [0, 1, 3])
+def test_wl_kernel_matrix_backends(seed, max_depth, iterations):
+    triples, instances = random_triples(seed)
+    reference = wlkernel.get_backend('reference')
+
+    def kernel_matrix(backend):
+        wl_graphs = [
+            backend.wl_graph(triples, instance, max_depth)
+            for instance in instances
+        ]
+        return backend.wl_kernel_matrix(wl_graphs, iterations)
+
+    expected, reference_time = timed(kernel_matrix, reference)
+    for name in wlkernel.available_backends():
+        actual, time = timed(kernel_matrix, wlkernel.get_backend(name))
+        assert actual == expected, name
+        print('{}: {:.2f}x'.format(name, reference_time / time))
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('max_depth', [0, 1, 2, 3])
+@pytest.mark.parametrize('iterations', [0, 1, 3])
+def test_wlrdf_kernel_matrix_backends(seed, max_depth, iterations):
+    triples, instances = random_triples(seed)
+    reference = wlkernel.get_backend('reference')
+
+    def kernel_matrix(backend):
+        graph = backend.wlrdf_graph(triples, instances, max_depth)
+        return backend.wlrdf_kernel_matrix(graph, instances, iterations)
+
+    expected, reference_time = timed(kernel_matrix, reference)
+    for name in wlkernel.available_backends():
+        actual, time = timed(kernel_matrix, wlkernel.get_backend(name))
+        assert np.array_equal(actual, expected), name
+        print('{}: {:.2f}x'.format(name, reference_time / time))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_pruned_kernel_matrix_backends(seed):
+    triples, instances = random_triples(seed)
+    options = dict(max_neighbors=2, exclude_predicates=['P0'], max_degree=8)
+    reference = wlkernel.get_backend('reference')
+
+    def kernel_matrix(backend):
+        graph = backend.wlrdf_graph(triples, instances, 3, **options)
+        return graph.pruned, backend.wlrdf_kernel_matrix(graph, instances, 2)
+
+    expected_pruned, expected = kernel_matrix(reference)
+    for name in wlkernel.available_backends():
+        pruned, actual = kernel_matrix(wlkernel.get_backend(name))
+        assert pruned == expected_pruned, name
+        assert np.array_equal(actual, expected), name
@@ -1,10 +1,15 @@
+import os
+import signal
+import threading
 from os.path import abspath
+from random import Random
 from pkg_resources import resource_filename
 
 import pytest
 import rdflib
 
 import wlkernel
+from wlkernel._wlkernel import _ShardedRelabeler
 
 
 example_data = abspath(resource_filename('tests.resources', 'example.ttl'))
@@ -132,6 +137,59 @@ def test_wlgraph_depth_4():
     assert len(wl_graph.labels[0]) == len(wl_graph.nodes) + len(wl_graph.edges)
 
 
+def test_wlgraph_pruning():
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
+
+    wl_graph = wlkernel.WLGraph(triples, 'A1', 2, exclude_predicates=['P3'])
+    assert len(wl_graph.nodes) == 3
+    assert len(wl_graph.edges) == 2
+    assert wl_graph.pruned['predicates'] == 1
+
+    wl_graph = wlkernel.WLGraph(triples, 'A1', 2, max_degree=2)
+    assert len(wl_graph.nodes) == 2
+    assert len(wl_graph.edges) == 1
+    assert wl_graph.pruned['entities'] == 2
+
+    wl_graph = wlkernel.WLGraph(triples, 'A1', 4, max_neighbors=1)
+    same_graph = wlkernel.WLGraph(triples, 'A1', 4, max_neighbors=1)
+    assert len(wl_graph.edges) == len(same_graph.edges) < 7
+    assert wl_graph.pruned == same_graph.pruned
+    assert wl_graph.pruned['neighbors'] >= 1
+    assert (
+        sorted(wl_graph.labels[0].values())
+        == sorted(same_graph.labels[0].values())
+    )
+
+
+def test_wlgraph_pruning_order_independent():
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = sorted((str(s), str(p), str(o)) for s, p, o in rdf_graph)
+
+    for seed in range(5):
+        shuffled = list(triples)
+        Random(seed).shuffle(shuffled)
+        wl_graph = wlkernel.WLGraph(triples, 'A1', 4, max_neighbors=1)
+        shuffled_graph = wlkernel.WLGraph(shuffled, 'A1', 4, max_neighbors=1)
+        assert (
+            sorted(wl_graph.labels[0].values())
+            == sorted(shuffled_graph.labels[0].values())
+        )
+        assert wl_graph.pruned == shuffled_graph.pruned
+
+        wlrdf_graph = wlkernel.WLRDFGraph(
+            triples, ['A1', 'B1'], 4, max_neighbors=1
+        )
+        shuffled_graph = wlkernel.WLRDFGraph(
+            shuffled, ['A1', 'B1'], 4, max_neighbors=1
+        )
+        assert (
+            sorted(wlrdf_graph.labels[0].values())
+            == sorted(shuffled_graph.labels[0].values())
+        )
+        assert wlrdf_graph.pruned == shuffled_graph.pruned
+
+
 def test_wl_relabel():
     rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
     triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
@@ -159,6 +217,13 @@ def test_wl_relabel():
     assert len(wl_graph_a1.labels) == len(wl_graph_b1.labels) == 4
 
 
+def test_wl_relabel_no_label_collision():
+    # Without a separator, 'A' + 'BC' and 'AB' + 'C' expand to the same label
+    wl_graph_x = wlkernel.WLGraph([('x', 'BC', 'A')], 'x', 1)
+    wl_graph_y = wlkernel.WLGraph([('y', 'C', 'AB')], 'y', 1)
+    assert wlkernel.wl_kernel(wl_graph_x, wl_graph_y, 1) == 1*0.5 + 1*1
+
+
 def test_wl_kernel():
     rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
     triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
@@ -310,6 +375,31 @@ def test_wlrdfgraph_depth_4():
     assert len(wlrdf_graph.instance_edges['A1']) == 7
 
 
+def test_wlrdfgraph_pruning():
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
+
+    wlrdf_graph = wlkernel.WLRDFGraph(
+        triples, ['A1', 'B1'], 4, exclude_entities=['H', 'I']
+    )
+    assert wlrdf_graph.pruned['entities'] == 4
+    assert len(wlrdf_graph.instance_nodes['A1']) == 2
+    assert len(wlrdf_graph.instance_nodes['B1']) == 2
+
+    # 'D P4 H' is dropped while extracting both A1 and A2
+    wlrdf_graph = wlkernel.WLRDFGraph(
+        triples, ['A1', 'A2'], 2, exclude_entities=['H']
+    )
+    assert wlrdf_graph.pruned['entities'] == 2
+
+    wlrdf_graph = wlkernel.WLRDFGraph(
+        triples, ['A1', 'B1'], 1, max_neighbors=1
+    )
+    assert wlrdf_graph.pruned['neighbors'] == 2
+    assert len(wlrdf_graph.instance_edges['A1']) == 1
+    assert len(wlrdf_graph.instance_edges['B1']) == 1
+
+
 def test_wlrdf_relabel():
     rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
     triples = ((str(s), str(p), str(o)) for s, p, o in rdf_graph)
@@ -328,6 +418,13 @@ def test_wlrdf_relabel():
     assert len(uniq_labels_1) == len(uniq_labels_2)
 
 
+def test_wlrdf_relabel_no_label_collision():
+    # Without a separator, 'A' + 'BC' and 'AB' + 'C' expand to the same label
+    triples = [('x', 'BC', 'A'), ('y', 'C', 'AB')]
+    wlrdf_graph = wlkernel.WLRDFGraph(triples, ['x', 'y'], 1)
+    assert wlkernel.wlrdf_kernel(wlrdf_graph, 'x', 'y', 1) == 0
+
+
 def test_wlrdf_kernel():
     rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
     triples = ((str(s), str(p), str(o)) for s, p, o in rdf_graph)
@@ -350,3 +447,184 @@ def test_wlrdf_kernel_matrix():
     assert kernel_matrix[1][0] == wlkernel.wlrdf_kernel(
         wlrdf_graph, 'A1', 'B1'
     )
+
+
+def test_wl_kernel_matrix_compressed():
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
+    wl_graphs = [
+        wlkernel.WLGraph(triples, instance, 4)
+        for instance in ['A1', 'B1', 'A1', 'A2']
+    ]
+
+    kernel_matrix = wlkernel.wl_kernel_matrix(wl_graphs, iterations=1)
+    compressed, index = wlkernel.wl_kernel_matrix(
+        wl_graphs, iterations=1, compressed=True
+    )
+
+    assert len(compressed) == 3
+    assert index[0] == index[2]
+    assert len(kernel_matrix) == len(kernel_matrix[0]) == 4
+    for i in range(4):
+        for j in range(4):
+            assert kernel_matrix[i][j] == compressed[index[i]][index[j]]
+            assert kernel_matrix[i][j] == wlkernel.wl_kernel(
+                wl_graphs[i], wl_graphs[j], iterations=1
+            )
+
+
+def test_wlrdf_kernel_matrix_compressed():
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = ((str(s), str(p), str(o)) for s, p, o in rdf_graph)
+    wlrdf_graph = wlkernel.WLRDFGraph(triples, ['A1', 'B1'], 4)
+    instances = ['A1', 'B1', 'A1']
+
+    kernel_matrix = wlkernel.wlrdf_kernel_matrix(wlrdf_graph, instances, 1)
+    compressed, index = wlkernel.wlrdf_kernel_matrix(
+        wlrdf_graph, instances, 1, compressed=True
+    )
+
+    assert compressed.shape == (2, 2)
+    assert index == [0, 1, 0]
+    assert kernel_matrix.shape == (3, 3)
+    assert kernel_matrix[0][1] == wlkernel.wlrdf_kernel(
+        wlrdf_graph, 'A1', 'B1', 1
+    )
+    assert kernel_matrix[2][1] == kernel_matrix[0][1]
+
+
+@pytest.mark.parametrize('n_jobs', [2, 3, 8])
+def test_wl_relabel_parallel(n_jobs):
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
+    instances = ['A1', 'B1', 'A2', 'B2']
+    serial_graphs = [wlkernel.WLGraph(triples, i, 4) for i in instances]
+    parallel_graphs = [wlkernel.WLGraph(triples, i, 4) for i in instances]
+
+    wlkernel.wl_relabel(serial_graphs, 3)
+    wlkernel.wl_relabel(parallel_graphs, 3, n_jobs=n_jobs)
+
+    for serial, parallel in zip(serial_graphs, parallel_graphs):
+        assert len(serial.labels) == len(parallel.labels) == 4
+        for it in range(1, 4):
+            assert parallel.labels[it].keys() == parallel.labels[0].keys()
+    assert (
+        wlkernel.wl_kernel_matrix(serial_graphs, iterations=3)
+        == wlkernel.wl_kernel_matrix(parallel_graphs, iterations=3)
+    )
+
+
+def test_wl_relabel_parallel_empty():
+    wlkernel.wl_relabel([], 2, n_jobs=2)
+    with _ShardedRelabeler([], 2) as relabeler:
+        relabeler.relabel(2)
+
+
+def test_wl_relabel_parallel_dead_worker():
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
+    instances = ['A1', 'B1', 'A2', 'B2']
+    wl_graphs = [wlkernel.WLGraph(triples, i, 4) for i in instances]
+    relabeler = _ShardedRelabeler(wl_graphs, 2)
+    os.kill(relabeler.workers[0].pid, signal.SIGKILL)
+    relabeler.workers[0].join()
+
+    errors = []
+
+    def relabel():
+        try:
+            with relabeler:
+                relabeler.relabel(1)
+        except RuntimeError as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=relabel, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive()
+    assert len(errors) == 1
+    assert all(worker.exitcode is not None for worker in relabeler.workers)
+
+
+def test_wl_kernel_matrix_streaming_parallel():
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
+    instances = ['A1', 'B1', 'A2', 'B2']
+    wl_graphs = [wlkernel.WLGraph(triples, i, 4) for i in instances]
+    streamed_graphs = [wlkernel.WLGraph(triples, i, 4) for i in instances]
+
+    kernel_matrix = wlkernel.wl_kernel_matrix(wl_graphs, 3)
+    streamed_matrix = wlkernel.wl_kernel_matrix(
+        streamed_graphs, 3, n_jobs=2, streaming=True
+    )
+
+    assert kernel_matrix == streamed_matrix
+
+
+def test_wl_kernel_matrix_streaming():
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
+    instances = ['A1', 'B1', 'A2']
+    wl_graphs = [wlkernel.WLGraph(triples, i, 4) for i in instances]
+    streamed_graphs = [wlkernel.WLGraph(triples, i, 4) for i in instances]
+
+    kernel_matrix = wlkernel.wl_kernel_matrix(wl_graphs, iterations=3)
+    streamed_matrix = wlkernel.wl_kernel_matrix(
+        streamed_graphs, iterations=3, streaming=True
+    )
+
+    assert kernel_matrix == streamed_matrix
+    for wl_graph in streamed_graphs:
+        assert len(wl_graph.labels) == 4
+        assert wl_graph.labels[:3] == [None, None, None]
+        assert wl_graph.labels[3] is not None
+
+
+def test_wl_kernel_after_streaming():
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
+    wl_graphs = [wlkernel.WLGraph(triples, i, 4) for i in ['A1', 'B1']]
+    wlkernel.wl_kernel_matrix(wl_graphs, iterations=2, streaming=True)
+
+    with pytest.raises(ValueError):
+        wlkernel.wl_kernel_matrix(wl_graphs, iterations=2, streaming=True)
+    with pytest.raises(ValueError):
+        wlkernel.wl_kernel_matrix(wl_graphs, iterations=2)
+    with pytest.raises(ValueError):
+        wlkernel.wl_kernel(wl_graphs[0], wl_graphs[1], 2)
+    assert all(len(wl_graph.labels) == 3 for wl_graph in wl_graphs)
+
+
+def test_wlrdf_kernel_matrix_streaming():
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
+    instances = ['A1', 'B1', 'A2', 'B2']
+    wlrdf_graph = wlkernel.WLRDFGraph(triples, instances, 4)
+    streamed_graph = wlkernel.WLRDFGraph(triples, instances, 4)
+
+    kernel_matrix = wlkernel.wlrdf_kernel_matrix(wlrdf_graph, instances, 3)
+    streamed_matrix = wlkernel.wlrdf_kernel_matrix(
+        streamed_graph, instances, 3, streaming=True
+    )
+
+    assert (kernel_matrix == streamed_matrix).all()
+    assert len(streamed_graph.labels) == 4
+    assert streamed_graph.labels[:3] == [None, None, None]
+
+
+def test_wlrdf_kernel_after_streaming():
+    rdf_graph = rdflib.Graph().parse(example_data, format='turtle')
+    triples = [(str(s), str(p), str(o)) for s, p, o in rdf_graph]
+    instances = ['A1', 'B1']
+    wlrdf_graph = wlkernel.WLRDFGraph(triples, instances, 4)
+    wlkernel.wlrdf_kernel_matrix(wlrdf_graph, instances, 3, streaming=True)
+
+    with pytest.raises(ValueError):
+        wlkernel.wlrdf_kernel_matrix(
+            wlrdf_graph, instances, 3, streaming=True
+        )
+    with pytest.raises(ValueError):
+        wlkernel.wlrdf_kernel_matrix(wlrdf_graph, instances, 3)
+    with pytest.raises(ValueError):
+        wlkernel.wlrdf_kernel(wlrdf_graph, 'A1', 'B1', 3)
+    assert len(wlrdf_graph.labels) == 4
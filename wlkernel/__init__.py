@@ -8,7 +8,17 @@ from ._wlkernel import (
     wl_relabel,
     wl_kernel,
     wl_kernel_matrix,
+    wl_streaming_histograms,
     WLRDFGraph,
     wlrdf_kernel,
     wlrdf_kernel_matrix,
+    wlrdf_streaming_histograms,
+    histogram_kernel,
+)
+from ._backends import (
+    Backend,
+    register_backend,
+    set_backend,
+    get_backend,
+    available_backends,
 )
@@ -0,0 +1,145 @@
+from functools import partial
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Tuple,
+)
+
+from ._wlkernel import (
+    WLGraph,
+    WLRDFGraph,
+    subject_index,
+    wl_relabel,
+    wl_kernel,
+    wl_kernel_matrix,
+    wlrdf_kernel,
+    wlrdf_kernel_matrix,
+)
+
+
+OPERATIONS = (
+    'wl_graph',
+    'wl_relabel',
+    'wl_kernel',
+    'wl_kernel_matrix',
+    'wlrdf_graph',
+    'wlrdf_relabel',
+    'wlrdf_kernel',
+    'wlrdf_kernel_matrix',
+)
+
+# Kernel operations and the relabeling operation they are bound to
+RELABEL_OPERATIONS = {
+    'wl_kernel': 'wl_relabel',
+    'wl_kernel_matrix': 'wl_relabel',
+    'wlrdf_kernel': 'wlrdf_relabel',
+    'wlrdf_kernel_matrix': 'wlrdf_relabel',
+}
+
+
+class Backend:
+    '''
+    A set of implementations of the graph builders, relabeling and kernels
+
+    Every operation in `OPERATIONS` is available as an attribute. The
+    operations that are not given fall back to the reference backend.
+    Kernel operations must accept a `relabel` keyword argument: the backend
+    binds it to its own relabeling operation, so that a backend providing
+    only `wl_relabel` or `wlrdf_relabel` is used by the reference kernels.
+
+    Backends only apply to the operations called through them: the
+    functions and classes exported by the package are always the
+    reference implementation, whatever backend is selected.
+    '''
+
+    def __init__(self, name: str, **operations: Callable):
+        unknown = set(operations) - set(OPERATIONS)
+        if unknown:
+            raise ValueError(
+                'Unknown operations: {}'.format(', '.join(sorted(unknown)))
+            )
+        self.name = name
+        self.operations: Dict[str, Callable] = {
+            operation: operations[operation] if operation in operations
+            else get_backend('reference').operations[operation]
+            for operation in OPERATIONS
+        }
+        for operation, function in self.operations.items():
+            if operation in RELABEL_OPERATIONS:
+                relabel = self.operations[RELABEL_OPERATIONS[operation]]
+                function = partial(function, relabel=relabel)
+            setattr(self, operation, function)
+
+    def __repr__(self):
+        return 'Backend({!r})'.format(self.name)
+
+
+_backends: Dict[str, Backend] = dict()
+_default_backend = 'reference'
+
+
+def register_backend(backend: Backend):
+    'Make a backend available by its name'
+    _backends[backend.name] = backend
+
+
+def set_backend(name: str):
+    '''
+    Select the backend returned by default by `get_backend`
+
+    This does not change the functions and classes exported by the package,
+    which always use the reference implementation.
+    '''
+    global _default_backend
+    get_backend(name)
+    _default_backend = name
+
+
+def get_backend(name: str = None) -> Backend:
+    'Return the backend called `name`, or the selected one if not given'
+    if name is None:
+        name = _default_backend
+    if name not in _backends:
+        raise ValueError('Unknown backend: {!r}'.format(name))
+    return _backends[name]
+
+
+def available_backends() -> Tuple[str, ...]:
+    'Return the names of the registered backends'
+    return tuple(_backends)
+
+
+def _indexed_wl_graph(triples: Iterable[Tuple[str, str, str]],
+                      instance: str, max_depth: int, **kwargs) -> WLGraph:
+    'Build a WLGraph looking up triples through a subject index'
+    triples = list(triples)
+    return WLGraph(triples, instance, max_depth,
+                   index=subject_index(triples), **kwargs)
+
+
+def _indexed_wlrdf_graph(triples: Iterable[Tuple[str, str, str]],
+                         instances: Iterable[str], max_depth: int,
+                         **kwargs) -> WLRDFGraph:
+    'Build a WLRDFGraph looking up triples through a subject index'
+    triples = list(triples)
+    return WLRDFGraph(triples, instances, max_depth,
+                      index=subject_index(triples), **kwargs)
+
+
+register_backend(Backend(
+    'reference',
+    wl_graph=WLGraph,
+    wl_relabel=wl_relabel,
+    wl_kernel=wl_kernel,
+    wl_kernel_matrix=wl_kernel_matrix,
+    wlrdf_graph=WLRDFGraph,
+    wlrdf_relabel=WLRDFGraph.relabel,
+    wlrdf_kernel=wlrdf_kernel,
+    wlrdf_kernel_matrix=wlrdf_kernel_matrix,
+))
+register_backend(Backend(
+    'indexed',
+    wl_graph=_indexed_wl_graph,
+    wlrdf_graph=_indexed_wlrdf_graph,
+))
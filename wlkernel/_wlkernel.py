@@ -1,4 +1,5 @@
 from typing import (
+    Callable,
     List,
     Dict,
     Tuple,
@@ -8,11 +9,80 @@ from typing import (
 )
 from collections import Counter
 from itertools import chain
+from multiprocessing import Process, Queue
+from queue import Empty
+from random import Random
+from zlib import crc32
 
 from nptyping import Array
 import numpy as np
 
 
+Histogram = Tuple[Counter, Counter]
+Triple = Tuple[str, str, str]
+ExpandedLabel = Tuple[str, Tuple[str, ...]]
+
+
+def subject_index(triples: Iterable[Triple]) -> Dict[str, List[Triple]]:
+    'Group RDF triples by subject, preserving their order'
+    index: Dict[str, List[Triple]] = dict()
+    for s, p, o in triples:
+        index.setdefault(s, []).append((s, p, o))
+    return index
+
+
+def hub_entities(triples: Iterable[Triple], max_degree: int) -> Set[str]:
+    'Return the entities whose number of incident triples exceeds max_degree'
+    degrees = Counter()
+    for s, p, o in triples:
+        degrees[s] += 1
+        degrees[o] += 1
+    return {
+        entity for entity, degree in degrees.items() if degree > max_degree
+    }
+
+
+def _prune_triples(r: str, r_triples: Iterable[Triple],
+                   exclude_predicates: Set[str], exclude_entities: Set[str],
+                   max_neighbors: int, seed: int,
+                   dropped: Dict[str, Set[Triple]]) -> List[Triple]:
+    '''
+    Drop the triples of subject `r` that must not be followed
+
+    Triples with an excluded predicate or object are dropped, then at most
+    `max_neighbors` triples are kept, sampled deterministically from `r`,
+    `seed` and the set of candidate triples. The dropped triples are added
+    to `dropped`, by reason.
+    '''
+    kept = []
+    for t in r_triples:
+        if t[1] in exclude_predicates:
+            dropped['predicates'].add(t)
+        elif t[2] in exclude_entities:
+            dropped['entities'].add(t)
+        else:
+            kept.append(t)
+    if max_neighbors is not None and len(kept) > max_neighbors:
+        # Sample from the sorted triples, so that the order of the input
+        # triples does not change which ones are kept
+        kept = sorted(kept)
+        sample = set(Random('{}:{}'.format(seed, r)).sample(
+            range(len(kept)), max_neighbors
+        ))
+        dropped['neighbors'].update(
+            t for k, t in enumerate(kept) if k not in sample
+        )
+        kept = [t for k, t in enumerate(kept) if k in sample]
+    return kept
+
+
+def _pruned_counts(dropped: Dict[str, Set[Triple]]) -> Counter:
+    'Return the number of distinct dropped triples by reason'
+    return Counter({
+        reason: len(triples) for reason, triples in dropped.items()
+    })
+
+
 class Node:
     'A node of a Weisfeiler-Lehman RDF graph'
 
@@ -40,10 +110,34 @@ class WLGraph:
     'Standard Weisfeiler-Lehman graph with directed labeled edges'
 
     def __init__(self, triples: Iterable[Tuple[str, str, str]],
-                 instance: str, max_depth: int):
-        'Build a Weisfeiler-Lehman graph from a list of RDF triples'
+                 instance: str, max_depth: int,
+                 index: Dict[str, List[Triple]] = None,
+                 max_neighbors: int = None,
+                 exclude_predicates: Iterable[str] = (),
+                 exclude_entities: Iterable[str] = (),
+                 max_degree: int = None, seed: int = 0):
+        '''
+        Build a Weisfeiler-Lehman graph from a list of RDF triples
+
+        If given, `index` must be the `subject_index` of `triples` and is
+        used to look up the triples of each subject without a full scan.
+
+        Triples whose predicate is in `exclude_predicates`, or whose object
+        is in `exclude_entities` or has more than `max_degree` incident
+        triples, are not followed. At most `max_neighbors` triples are
+        followed from each node, sampled deterministically with `seed`.
+        The number of distinct dropped triples is reported in `pruned`, by
+        reason: 'predicates', 'entities' or 'neighbors'.
+        '''
         triples = list(triples)
         self.max_depth = max_depth
+        dropped: Dict[str, Set[Triple]] = {
+            'predicates': set(), 'entities': set(), 'neighbors': set()
+        }
+        exclude_predicates = set(exclude_predicates)
+        exclude_entities = set(exclude_entities)
+        if max_degree is not None:
+            exclude_entities |= hub_entities(triples, max_degree)
         self.nodes: Set[Node] = set()
         self.edges: Set[Edge] = set()
         self.labels: List[Dict[Union[Node, Edge], str]] = [dict()]
@@ -60,7 +154,14 @@ class WLGraph:
         for j in reversed(range(0, max_depth)):
             new_search_front = set()
             for r in search_front:
-                r_triples = [(s, p, o) for s, p, o in triples if s == r]
+                if index is not None:
+                    r_triples = index.get(r, [])
+                else:
+                    r_triples = [(s, p, o) for s, p, o in triples if s == r]
+                r_triples = _prune_triples(
+                    r, r_triples, exclude_predicates, exclude_entities,
+                    max_neighbors, seed, dropped
+                )
                 for sub, pred, obj in r_triples:
                     new_search_front.add(obj)
 
@@ -82,11 +183,27 @@ class WLGraph:
 
             search_front = new_search_front
 
+        self.pruned = _pruned_counts(dropped)
+
+
+def wl_relabel(wl_graphs: Iterable[WLGraph], iterations: int = 1,
+               n_jobs: int = 1, keep_history: bool = True):
+    '''
+    Relabeling algorithm
 
-def wl_relabel(wl_graphs: Iterable[WLGraph], iterations: int = 1):
-    'Relabeling algorithm'
+    If `n_jobs` is greater than 1, the graphs are split in shards that are
+    relabeled in `n_jobs` worker processes (see `_ShardedRelabeler`).
+    If `keep_history` is False, the label maps of the previous iterations
+    are replaced by None as soon as they are no longer needed.
+    '''
 
     wl_graphs = list(wl_graphs)
+    if not wl_graphs:
+        return
+    if n_jobs > 1:
+        with _ShardedRelabeler(wl_graphs, n_jobs) as relabeler:
+            relabeler.relabel(iterations, keep_history)
+        return
 
     assert len(set(len(wl_graph.labels) for wl_graph in wl_graphs))
     m = len(wl_graphs[0].labels)
@@ -98,17 +215,17 @@ def wl_relabel(wl_graphs: Iterable[WLGraph], iterations: int = 1):
         ]
         for wl_graph, multisets in zip(wl_graphs, multisets_list):
             for v in wl_graph.nodes:
-                if v in wl_graph.labels[0]:
+                if v in wl_graph.labels[i - 1]:
                     multisets[v] = [
                         wl_graph.labels[i - 1][u] for u in v.neighbors
                         if u in wl_graph.labels[i - 1]
                     ]
             for e in wl_graph.edges:
-                if e in wl_graph.labels[0]:
+                if e in wl_graph.labels[i - 1]:
                     multisets[e] = [ wl_graph.labels[i - 1][e.neighbor] ]
 
         # 2. Sorting each multiset
-        expanded_labels_list: List[Dict[Union[Node, Edge], str]] = [
+        expanded_labels_list: List[Dict[Union[Node, Edge], ExpandedLabel]] = [
             dict() for _ in range(len(wl_graphs))
         ]
         for wl_graph, multisets, expanded_labels in zip(wl_graphs,
@@ -116,7 +233,7 @@ def wl_relabel(wl_graphs: Iterable[WLGraph], iterations: int = 1):
                                                         expanded_labels_list):
             for k, multiset in multisets.items():
                 expanded_labels[k] = (
-                    wl_graph.labels[i - 1][k] + ''.join(sorted(multiset))
+                    wl_graph.labels[i - 1][k], tuple(sorted(multiset))
                 )
 
         # 3. Label compression
@@ -134,68 +251,357 @@ def wl_relabel(wl_graphs: Iterable[WLGraph], iterations: int = 1):
             wl_graph.labels.append({
                 k: f[expanded_labels[k]] for k in expanded_labels
             })
+            if not keep_history:
+                _discard_history(wl_graph.labels)
+
+
+def _label_partition(label: ExpandedLabel, n_partitions: int) -> int:
+    'Return the partition of an expanded label, stable across processes'
+    return crc32(repr(label).encode()) % n_partitions
+
+
+def _wl_shard_worker(shard_id: int,
+                     shard: List[Tuple[List[str], List[List[int]]]],
+                     label_inboxes: List[Queue], id_inboxes: List[Queue],
+                     commands: Queue, results: Queue):
+    '''
+    Relabel a shard of graphs at each command received
+
+    Each graph of the shard is given as the list of its current labels and,
+    for each element, the positions of its neighbors; both stay in the
+    worker. The expanded labels are partitioned by hash and sent to the
+    worker owning each partition, which compresses them and sends back
+    the compressed labels. Only the compressed labels of the shard are
+    put in `results`.
+    '''
+    n_partitions = len(label_inboxes)
+    while commands.get() is not None:
+
+        # 1-2. Multiset-label determination and sorting
+        table: Dict[ExpandedLabel, int] = dict()
+        ids_list: List[List[int]] = []
+        for labels, neighbors in shard:
+            ids_list.append([
+                table.setdefault(
+                    (labels[k], tuple(sorted(labels[u] for u in positions))),
+                    len(table)
+                )
+                for k, positions in enumerate(neighbors)
+            ])
+
+        # 3. Label compression, partitioned by hash of the expanded label
+        buckets: List[List[ExpandedLabel]] = [[] for _ in range(n_partitions)]
+        bucket_ids: List[List[int]] = [[] for _ in range(n_partitions)]
+        for k, expanded_label in enumerate(table):
+            p = _label_partition(expanded_label, n_partitions)
+            buckets[p].append(expanded_label)
+            bucket_ids[p].append(k)
+        for p in range(n_partitions):
+            label_inboxes[p].put((shard_id, buckets[p]))
+
+        received = sorted(
+            (label_inboxes[shard_id].get() for _ in range(n_partitions)),
+            key=lambda message: message[0]
+        )
+        f: Dict[ExpandedLabel, str] = dict()
+        for sender, bucket in received:
+            id_inboxes[sender].put((shard_id, [
+                f.setdefault(
+                    label, str(len(f) * n_partitions + shard_id)
+                )
+                for label in bucket
+            ]))
+        del f, received
 
+        compressed_labels: List[str] = [''] * len(table)
+        for _ in range(n_partitions):
+            p, labels = id_inboxes[shard_id].get()
+            for k, label in zip(bucket_ids[p], labels):
+                compressed_labels[k] = label
+        del table, buckets
 
-def wl_kernel(wl_graph_1: WLGraph, wl_graph_2: WLGraph,
-              iterations: int = 0) -> float:
-    'Compute the Weisfeiler-Lehman kernel for two WLGraphs'
-
-    assert len(wl_graph_1.labels) == len(wl_graph_2.labels)
-    m = len(wl_graph_1.labels)
-    if iterations > m - 1:
-        wl_relabel([wl_graph_1, wl_graph_2], iterations - m + 1)
-
-    kernel = 0.0
-    for it in range(iterations + 1):
-        node_labels_1 = [
-            wl_graph_1.labels[it][node] for node in wl_graph_1.nodes
-        ]
-        node_labels_2 = [
-            wl_graph_2.labels[it][node] for node in wl_graph_2.nodes
-        ]
-        edge_labels_1 = [
-            wl_graph_1.labels[it][edge] for edge in wl_graph_1.edges
-        ]
-        edge_labels_2 = [
-            wl_graph_2.labels[it][edge] for edge in wl_graph_2.edges
+        # 4. Relabeling
+        new_labels_list = []
+        for g, ids in enumerate(ids_list):
+            new_labels = [compressed_labels[k] for k in ids]
+            shard[g] = (new_labels, shard[g][1])
+            new_labels_list.append(new_labels)
+        results.put((shard_id, new_labels_list))
+
+
+class _ShardedRelabeler:
+    '''
+    Relabeling algorithm over shards of WLGraphs in worker processes
+
+    The structure and the current labels of each shard stay in a dedicated
+    worker process for the lifetime of the relabeler, and each worker owns
+    a hash partition of the label compression (see `_wl_shard_worker`).
+    The WLGraphs must not be relabeled by other means while it is open.
+    '''
+
+    def __init__(self, wl_graphs: List[WLGraph], n_jobs: int):
+        self.wl_graphs = wl_graphs
+        self.bounds: List[Tuple[int, int]] = []
+        self.commands: List[Queue] = []
+        self.workers: List[Process] = []
+        if not wl_graphs:
+            return
+        assert len(set(len(wl_graph.labels) for wl_graph in wl_graphs)) == 1
+
+        m = len(wl_graphs[0].labels)
+        self.elements_list: List[List[Union[Node, Edge]]] = []
+        neighbors_list: List[List[List[int]]] = []
+        for wl_graph in wl_graphs:
+            last_labels = wl_graph.labels[m - 1]
+            elements = [v for v in wl_graph.nodes if v in last_labels]
+            elements += [e for e in wl_graph.edges if e in last_labels]
+            position = {x: k for k, x in enumerate(elements)}
+            neighbors_list.append([
+                [position[u] for u in v.neighbors if u in position]
+                if isinstance(v, Node) else [position[v.neighbor]]
+                for v in elements
+            ])
+            self.elements_list.append(elements)
+
+        n = len(wl_graphs)
+        shard_size = -(-n // n_jobs)
+        self.bounds = [
+            (k, min(k + shard_size, n)) for k in range(0, n, shard_size)
         ]
-        cc_nodes = count_commons(node_labels_1, node_labels_2)
-        cc_edges = count_commons(edge_labels_1, edge_labels_2)
-        w = (it + 1) / (iterations + 1)
-        kernel += w * (cc_nodes + cc_edges)
-    return kernel
+        n_shards = len(self.bounds)
+        label_inboxes = [Queue() for _ in range(n_shards)]
+        id_inboxes = [Queue() for _ in range(n_shards)]
+        self.commands = [Queue() for _ in range(n_shards)]
+        self.results = Queue()
+        for shard_id, (start, stop) in enumerate(self.bounds):
+            shard = [
+                (
+                    [wl_graphs[g].labels[m - 1][x]
+                     for x in self.elements_list[g]],
+                    neighbors_list[g],
+                )
+                for g in range(start, stop)
+            ]
+            worker = Process(
+                target=_wl_shard_worker,
+                args=(shard_id, shard, label_inboxes, id_inboxes,
+                      self.commands[shard_id], self.results),
+                daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def relabel(self, iterations: int = 1, keep_history: bool = True):
+        'Relabel the WLGraphs, see `wl_relabel`'
+        for _ in range(iterations):
+            for commands in self.commands:
+                commands.put('relabel')
+            for _ in self.workers:
+                shard_id, new_labels_list = self._result()
+                start, stop = self.bounds[shard_id]
+                for g, new_labels in zip(range(start, stop), new_labels_list):
+                    labels = self.wl_graphs[g].labels
+                    labels.append(dict(zip(self.elements_list[g], new_labels)))
+                    if not keep_history:
+                        _discard_history(labels)
+
+    def _result(self):
+        'Wait for the result of a worker, failing if any worker died'
+        while True:
+            try:
+                return self.results.get(timeout=1)
+            except Empty:
+                if any(w.exitcode is not None for w in self.workers):
+                    raise RuntimeError('A relabeling worker has died')
+
+    def close(self, terminate: bool = False):
+        '''
+        Stop the worker processes
+
+        Workers are terminated instead of being asked to stop if `terminate`
+        is True or if any of them died, since the others may then be blocked
+        waiting for its labels.
+        '''
+        if not terminate and all(w.exitcode is None for w in self.workers):
+            for commands in self.commands:
+                commands.put(None)
+            for worker in self.workers:
+                worker.join(timeout=10)
+        for worker in self.workers:
+            if worker.exitcode is None:
+                worker.terminate()
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(terminate=exc_type is not None)
+
+
+def _discard_history(labels: List[Dict]):
+    'Replace every label map but the last one by None'
+    for k in range(len(labels) - 1):
+        labels[k] = None
+
+
+def _check_history(labels: List[Dict], iterations: int):
+    'Raise a ValueError if a label map up to `iterations` was discarded'
+    discarded = [
+        it for it in range(min(iterations + 1, len(labels)))
+        if labels[it] is None
+    ]
+    if discarded:
+        raise ValueError(
+            'The label maps of iterations {} were discarded by a streaming '
+            'relabel: rebuild the graph to use them again'.format(
+                ', '.join(map(str, discarded))
+            )
+        )
 
 
-def wl_kernel_matrix(wl_graphs: Iterable[WLGraph],
-                     iterations: int = 0) -> List[List[float]]:
-    'Compute the matrix of the kernel values between each couple of WLGraphs'
+def wl_streaming_histograms(
+        wl_graphs: Iterable[WLGraph], iterations: int = 0, n_jobs: int = 1,
+        relabel: Callable = wl_relabel) -> List[List[Histogram]]:
+    '''
+    Relabel the WLGraphs and collect their label counts at each iteration
+
+    Label counts are collected as the iterations are produced and the label
+    maps of the previous iterations are discarded, so that at most two
+    generations of labels are kept in memory at once. After the call, only
+    the last generation of `labels` is available in each WLGraph, and the
+    functions that need a discarded generation raise a ValueError.
+    `relabel` is the relabeling algorithm, called as `wl_relabel`.
+    '''
     wl_graphs = list(wl_graphs)
+    for wl_graph in wl_graphs:
+        _check_history(wl_graph.labels, iterations)
 
     m = len(wl_graphs[0].labels)
+    histograms_list = [
+        [wl_histogram(wl_graph, it) for it in range(min(m, iterations + 1))]
+        for wl_graph in wl_graphs
+    ]
+    relabeler = None
+    if relabel is wl_relabel and n_jobs > 1 and iterations >= m:
+        relabeler = _ShardedRelabeler(wl_graphs, n_jobs)
+    try:
+        for it in range(m, iterations + 1):
+            if relabeler is not None:
+                relabeler.relabel(1, keep_history=False)
+            else:
+                relabel(wl_graphs, 1, n_jobs=n_jobs, keep_history=False)
+            for wl_graph, histograms in zip(wl_graphs, histograms_list):
+                histograms.append(wl_histogram(wl_graph, it))
+    except BaseException:
+        if relabeler is not None:
+            relabeler.close(terminate=True)
+        raise
+    if relabeler is not None:
+        relabeler.close()
+    for wl_graph in wl_graphs:
+        _discard_history(wl_graph.labels)
+    return histograms_list
+
+
+def wl_kernel(wl_graph_1: WLGraph, wl_graph_2: WLGraph,
+              iterations: int = 0, relabel: Callable = wl_relabel) -> float:
+    '''
+    Compute the Weisfeiler-Lehman kernel for two WLGraphs
+
+    `relabel` is the relabeling algorithm, called as `wl_relabel`.
+    '''
+
+    assert len(wl_graph_1.labels) == len(wl_graph_2.labels)
+    _check_history(wl_graph_1.labels, iterations)
+    _check_history(wl_graph_2.labels, iterations)
+    m = len(wl_graph_1.labels)
     if iterations > m - 1:
-        wl_relabel(wl_graphs, iterations - m + 1)
+        relabel([wl_graph_1, wl_graph_2], iterations - m + 1)
+
+    return histogram_kernel(
+        wl_histograms(wl_graph_1, iterations),
+        wl_histograms(wl_graph_2, iterations),
+    )
+
+
+def wl_kernel_matrix(
+        wl_graphs: Iterable[WLGraph], iterations: int = 0,
+        compressed: bool = False, n_jobs: int = 1, streaming: bool = False,
+        relabel: Callable = wl_relabel
+) -> Union[List[List[float]], Tuple[List[List[float]], List[int]]]:
+    '''
+    Compute the matrix of the kernel values between each couple of WLGraphs
+
+    WLGraphs with identical label histograms at every iteration share the
+    same row of the matrix, so the kernel is only computed among unique
+    representatives. If `compressed` is True, return the matrix over the
+    representatives together with the index map `index`, such that the value
+    for graphs i and j is `matrix[index[i]][index[j]]`. `n_jobs` is passed
+    to `relabel`, the relabeling algorithm (`wl_relabel` by default). If
+    `streaming` is True, the label counts are collected with
+    `wl_streaming_histograms`, which discards old label maps.
+    '''
+    wl_graphs = list(wl_graphs)
 
-    n = len(wl_graphs)
+    if streaming:
+        histograms = wl_streaming_histograms(
+            wl_graphs, iterations, n_jobs, relabel
+        )
+    else:
+        for wl_graph in wl_graphs:
+            _check_history(wl_graph.labels, iterations)
+        m = len(wl_graphs[0].labels)
+        if iterations > m - 1:
+            relabel(wl_graphs, iterations - m + 1, n_jobs=n_jobs)
+        histograms = [
+            wl_histograms(wl_graph, iterations) for wl_graph in wl_graphs
+        ]
+    representatives, index = unique_histograms(histograms)
+
+    n = len(representatives)
     kernel_matrix = [[0.0]*n for _ in range(n)]
     for i in range(n):
         for j in range(i, n):
-            kernel_matrix[i][j] = wl_kernel(
-                wl_graphs[i], wl_graphs[j], iterations
+            kernel_matrix[i][j] = histogram_kernel(
+                histograms[representatives[i]],
+                histograms[representatives[j]],
             )
     for i in range(n):
         for j in range(0, i):
             kernel_matrix[i][j] = kernel_matrix[j][i]
-    return kernel_matrix
+
+    if compressed:
+        return kernel_matrix, index
+    return [[kernel_matrix[i][j] for j in index] for i in index]
 
 
 class WLRDFGraph:
     'Weisfeiler-Lehman RDF graph'
 
     def __init__(self, triples: Iterable[Tuple[str, str, str]],
-                 instances: Iterable[str], max_depth: int):
-        'Build a Weisfeiler-Lehman RDF graph from a list of RDF triples'
+                 instances: Iterable[str], max_depth: int,
+                 index: Dict[str, List[Triple]] = None,
+                 max_neighbors: int = None,
+                 exclude_predicates: Iterable[str] = (),
+                 exclude_entities: Iterable[str] = (),
+                 max_degree: int = None, seed: int = 0):
+        '''
+        Build a Weisfeiler-Lehman RDF graph from a list of RDF triples
+
+        If given, `index` must be the `subject_index` of `triples`. The
+        pruning options are the ones of `WLGraph`; `pruned` counts the
+        distinct triples dropped over the extraction of all the instances.
+        '''
         triples = list(triples)
         self.max_depth = max_depth
+        dropped: Dict[str, Set[Triple]] = {
+            'predicates': set(), 'entities': set(), 'neighbors': set()
+        }
+        exclude_predicates = set(exclude_predicates)
+        exclude_entities = set(exclude_entities)
+        if max_degree is not None:
+            exclude_entities |= hub_entities(triples, max_degree)
         self.nodes: Set[Node] = set()
         self.edges: Set[Edge] = set()
         self.labels: List[Dict[Tuple[Union[Node, Edge], int], str]] = [dict()]
@@ -222,7 +628,16 @@ class WLRDFGraph:
             for j in reversed(range(0, max_depth)):
                 new_search_front = set()
                 for r in search_front:
-                    r_triples = ((s, p, o) for s, p, o in triples if s == r)
+                    if index is not None:
+                        r_triples = index.get(r, [])
+                    else:
+                        r_triples = (
+                            (s, p, o) for s, p, o in triples if s == r
+                        )
+                    r_triples = _prune_triples(
+                        r, r_triples, exclude_predicates, exclude_entities,
+                        max_neighbors, seed, dropped
+                    )
                     for sub, pred, obj in r_triples:
                         new_search_front.add(obj)
 
@@ -248,10 +663,17 @@ class WLRDFGraph:
 
                 search_front = new_search_front
 
+        self.pruned = _pruned_counts(dropped)
+
 
 
-    def relabel(self, iterations: int = 1):
-        'Relabeling algorithm'
+    def relabel(self, iterations: int = 1, keep_history: bool = True):
+        '''
+        Relabeling algorithm
+
+        If `keep_history` is False, the label maps of the previous iterations
+        are replaced by None as soon as they are no longer needed.
+        '''
 
         for i in range(len(self.labels), len(self.labels) + iterations):
 
@@ -260,21 +682,21 @@ class WLRDFGraph:
             # 1. Multiset-label determination
             for v in self.nodes:
                 for j in range(self.max_depth + 1):
-                    if (v, j) in self.labels[0]:
+                    if (v, j) in self.labels[i - 1]:
                         multisets[(v, j)] = [
                             self.labels[i - 1][(u, j)] for u in v.neighbors
                             if (u, j) in self.labels[i - 1]
                         ]
             for e in self.edges:
                 for j in range(self.max_depth):
-                    if (e, j) in self.labels[0]:
+                    if (e, j) in self.labels[i - 1]:
                         multisets[(e, j)] = [
                             self.labels[i - 1][(e.neighbor, j + 1)]
                         ]
 
             # 2. Sorting each multiset
             expanded_labels = {
-                (k, j): self.labels[i - 1][(k, j)] + ''.join(sorted(multiset))
+                (k, j): (self.labels[i - 1][(k, j)], tuple(sorted(multiset)))
                 for (k, j), multiset in multisets.items()
             }
 
@@ -289,65 +711,179 @@ class WLRDFGraph:
                 (k, j): f[expanded_labels[(k, j)]]
                 for (k, j) in expanded_labels
             })
+            if not keep_history:
+                _discard_history(self.labels)
 
 
-def count_commons(a: Iterable, b: Iterable) -> int:
-    'Return the number of common elements in the two iterables'
-    uniques = set(a).intersection(set(b))
-    counter_a = Counter(a)
-    counter_b = Counter(b)
-    commons = 0
-    for u in uniques:
-        commons += counter_a[u] * counter_b[u]
-    return commons
+def wl_histogram(wl_graph: WLGraph, it: int) -> Histogram:
+    'Return the node and edge label counts of a WLGraph at iteration `it`'
+    return (
+        Counter(wl_graph.labels[it][node] for node in wl_graph.nodes),
+        Counter(wl_graph.labels[it][edge] for edge in wl_graph.edges),
+    )
 
 
-def wlrdf_kernel(graph: WLRDFGraph, instance_1: str, instance_2: str,
-                 iterations: int = 0) -> float:
-    'Compute the Weisfeiler-Lehman kernel for two instances'
+def wl_histograms(wl_graph: WLGraph, iterations: int = 0) -> List[Histogram]:
+    'Return the node and edge label counts of a WLGraph at each iteration'
+    _check_history(wl_graph.labels, iterations)
+    return [wl_histogram(wl_graph, it) for it in range(iterations + 1)]
 
-    if iterations > len(graph.labels) - 1:
-        graph.relabel(iterations - len(graph.labels) + 1)
 
-    kernel = 0.0
-    for it in range(iterations + 1):
-        node_labels_1 = [
-            graph.labels[it][(v, d)]
-            for v, d in graph.instance_nodes[instance_1].items()
-        ]
-        node_labels_2 = [
+def wlrdf_histogram(graph: WLRDFGraph, instance: str, it: int) -> Histogram:
+    'Return the node and edge label counts of an instance at iteration `it`'
+    return (
+        Counter(
             graph.labels[it][(v, d)]
-            for v, d in graph.instance_nodes[instance_2].items()
-        ]
-        edge_labels_1 = [
-            graph.labels[it][(e, d)]
-            for e, d in graph.instance_edges[instance_1].items()
-        ]
-        edge_labels_2 = [
+            for v, d in graph.instance_nodes[instance].items()
+        ),
+        Counter(
             graph.labels[it][(e, d)]
-            for e, d in graph.instance_edges[instance_2].items()
+            for e, d in graph.instance_edges[instance].items()
+        ),
+    )
+
+
+def wlrdf_histograms(graph: WLRDFGraph, instance: str,
+                     iterations: int = 0) -> List[Histogram]:
+    'Return the node and edge label counts of an instance at each iteration'
+    _check_history(graph.labels, iterations)
+    return [
+        wlrdf_histogram(graph, instance, it) for it in range(iterations + 1)
+    ]
+
+
+def wlrdf_streaming_histograms(
+        graph: WLRDFGraph, instances: List[str], iterations: int = 0,
+        relabel: Callable = WLRDFGraph.relabel) -> List[List[Histogram]]:
+    '''
+    Relabel the graph and collect the label counts of each instance
+
+    Label maps of the previous iterations are discarded as the iterations
+    are produced (see `wl_streaming_histograms`). `relabel` is the
+    relabeling algorithm, called as `WLRDFGraph.relabel`.
+    '''
+    _check_history(graph.labels, iterations)
+    m = len(graph.labels)
+    histograms_list = [
+        [
+            wlrdf_histogram(graph, instance, it)
+            for it in range(min(m, iterations + 1))
         ]
-        cc_nodes = count_commons(node_labels_1, node_labels_2)
-        cc_edges = count_commons(edge_labels_1, edge_labels_2)
+        for instance in instances
+    ]
+    for it in range(m, iterations + 1):
+        relabel(graph, 1, keep_history=False)
+        for instance, histograms in zip(instances, histograms_list):
+            histograms.append(wlrdf_histogram(graph, instance, it))
+    _discard_history(graph.labels)
+    return histograms_list
+
+
+def histogram_kernel(histograms_1: List[Histogram],
+                     histograms_2: List[Histogram]) -> float:
+    'Compute the Weisfeiler-Lehman kernel from two lists of label counts'
+    assert len(histograms_1) == len(histograms_2)
+    iterations = len(histograms_1) - 1
+    kernel = 0.0
+    for it, ((nodes_1, edges_1), (nodes_2, edges_2)) in enumerate(
+            zip(histograms_1, histograms_2)):
+        cc_nodes = sum(
+            nodes_1[label] * nodes_2[label]
+            for label in nodes_1.keys() & nodes_2.keys()
+        )
+        cc_edges = sum(
+            edges_1[label] * edges_2[label]
+            for label in edges_1.keys() & edges_2.keys()
+        )
         w = (it + 1) / (iterations + 1)
         kernel += w * (cc_nodes + cc_edges)
     return kernel
 
 
-def wlrdf_kernel_matrix(graph: WLRDFGraph, instances: List[str],
-                        iterations: int = 0) -> Array[float]:
-    'Compute the matrix of the kernel values between each couple of instances'
-    n = len(instances)
+def unique_histograms(
+        histograms_list: List[List[Histogram]]) -> Tuple[List[int], List[int]]:
+    '''
+    Group identical lists of label counts
+
+    Return the positions of the unique representatives and, for each element
+    of `histograms_list`, the index of its representative among them.
+    '''
+    representatives: List[int] = []
+    index: List[int] = []
+    seen: Dict[Tuple, int] = dict()
+    for k, histograms in enumerate(histograms_list):
+        signature = tuple(
+            (frozenset(nodes.items()), frozenset(edges.items()))
+            for nodes, edges in histograms
+        )
+        if signature not in seen:
+            seen[signature] = len(representatives)
+            representatives.append(k)
+        index.append(seen[signature])
+    return representatives, index
+
+
+def wlrdf_kernel(graph: WLRDFGraph, instance_1: str, instance_2: str,
+                 iterations: int = 0,
+                 relabel: Callable = WLRDFGraph.relabel) -> float:
+    '''
+    Compute the Weisfeiler-Lehman kernel for two instances
+
+    `relabel` is the relabeling algorithm, called as `WLRDFGraph.relabel`.
+    '''
+
+    _check_history(graph.labels, iterations)
+    if iterations > len(graph.labels) - 1:
+        relabel(graph, iterations - len(graph.labels) + 1)
+
+    return histogram_kernel(
+        wlrdf_histograms(graph, instance_1, iterations),
+        wlrdf_histograms(graph, instance_2, iterations),
+    )
+
+
+def wlrdf_kernel_matrix(
+        graph: WLRDFGraph, instances: List[str], iterations: int = 0,
+        compressed: bool = False, streaming: bool = False,
+        relabel: Callable = WLRDFGraph.relabel
+) -> Union[Array[float], Tuple[Array[float], List[int]]]:
+    '''
+    Compute the matrix of the kernel values between each couple of instances
+
+    Instances with identical label histograms at every iteration share the
+    same row of the matrix (see `wl_kernel_matrix`). If `streaming` is True,
+    the label counts are collected with `wlrdf_streaming_histograms`.
+    `relabel` is the relabeling algorithm, called as `WLRDFGraph.relabel`.
+    '''
+    if streaming:
+        histograms = wlrdf_streaming_histograms(
+            graph, instances, iterations, relabel
+        )
+    else:
+        _check_history(graph.labels, iterations)
+        if iterations > len(graph.labels) - 1:
+            relabel(graph, iterations - len(graph.labels) + 1)
+        histograms = [
+            wlrdf_histograms(graph, instance, iterations)
+            for instance in instances
+        ]
+    representatives, index = unique_histograms(histograms)
+
+    n = len(representatives)
     kernel_matrix = np.zeros((n, n))
     for i in range(n):
         for j in range(i, n):
-            kernel_matrix[i][j] = wlrdf_kernel(
-                graph, instances[i], instances[j], iterations
+            kernel_matrix[i][j] = histogram_kernel(
+                histograms[representatives[i]],
+                histograms[representatives[j]],
             )
     for i in range(n):
         for j in range(0, i):
             kernel_matrix[i][j] = kernel_matrix[j][i]
-    return kernel_matrix
+
+    if compressed:
+        return kernel_matrix, index
+    return kernel_matrix[np.ix_(index, index)]
 
 
 def kernel_normalization(kernel_matrix: Array[float]) -> Array[float]: